@@ -4,36 +4,143 @@ Generate lightweight index of all MCP servers, tools, and agents.
 This reduces initial context load from ~108k to ~5k tokens.
 """
 
+import copy
 import json
+import mmap
 import os
 import re
 import subprocess
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import quote
+
+# Optional: pysimdjson lazily materializes only the JSON subtrees we
+# touch. Fall back to stdlib json if it isn't installed.
+try:
+    import simdjson
+    _JSON_PARSER = simdjson.Parser()
+except ImportError:
+    _JSON_PARSER = None
+
+# Optional: orjson serializes several times faster than stdlib json.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 CLAUDE_DIR = Path.home() / ".claude"
 REGISTRY_FILE = CLAUDE_DIR / "optimization" / "tool-registry.json"
 
+# Two-phase layout: a small keyword index loaded at startup, plus one
+# config file per tool that the lazy loader reads only when the tool
+# is actually loaded
+REGISTRY_DIR = CLAUDE_DIR / "optimization" / "tool-registry"
+INDEX_FILE = REGISTRY_DIR / "index.json"
+CONFIG_DIR = REGISTRY_DIR / "configs"
+
+# Compiled once: agent definition pattern for CLAUDE.md scanning.
+# Bytes pattern so it can run directly over a memory-mapped file.
+AGENT_PATTERN = re.compile(rb"([\w-]+)-agent.*?:\s*([^\n]+)", re.IGNORECASE)
+
+# Compiled once: all fallback trigger keywords in a single alternation,
+# so extract_keywords scans the text one time instead of five
+KEYWORD_PATTERN = re.compile(
+    r'\b(React|Vue|Angular|Next\.js|Express'
+    r'|API|database|server|frontend|backend'
+    r'|test|debug|analyze|build|deploy'
+    r'|security|performance|optimization'
+    r'|WordPress|Docker|Kubernetes)\b',
+    re.IGNORECASE
+)
+
+# Directories that never contain agent definitions - pruned during scans
+SKIP_DIRS = {"node_modules", ".git", "cache", "logs", "__pycache__"}
+
+# Known trigger keywords per MCP server, keyed by canonical server name
+KEYWORD_MAP = {
+    "sequential-thinking": ["complex", "analyze", "think", "debug", "architect", "systematic", "reasoning"],
+    "context7": ["import", "require", "react", "vue", "angular", "next", "framework", "library", "docs"],
+    "magic": ["ui", "component", "button", "form", "modal", "frontend", "design", "/ui", "/21"],
+    "playwright": ["browser", "test", "e2e", "screenshot", "automation", "visual", "testing"],
+    "serena": ["symbol", "rename", "refactor", "find_symbol", "memory", "onboarding", "semantic"],
+    "morphllm": ["bulk", "edit", "pattern", "replace", "multi-file", "fast-apply"],
+    "ssh-wordpress": ["wordpress", "staging", "wp-cli", "theme", "css", "hostinger"],
+    "wordpress-tayloredfocus": ["tayloredfocus", "coaching", "post", "page", "content"],
+    "proxmox": ["vm", "container", "proxmox", "virtualization", "lxc"]
+}
+
+# Static portion of the registry; generate_registry copies this and
+# fills in the generated timestamp plus the detected tools
+_REGISTRY_SKELETON = {
+    "version": "2.1.0",
+    "generated": None,
+    "description": "Auto-generated lightweight tool registry for lazy loading",
+    "stats": {
+        "before_optimization": {
+            "mcp_tools": "39.8k tokens",
+            "custom_agents": "9.7k tokens",
+            "system_tools": "22.6k tokens",
+            "memory_files": "36.0k tokens",
+            "total": "~108k tokens (54%)"
+        },
+        "after_optimization": {
+            "registry_size": "~5k tokens",
+            "lazy_load_enabled": True,
+            "expected_reduction": "95%"
+        }
+    },
+    "mcp_servers": {},
+    "custom_agents": {},
+    "optimization_rules": {
+        "max_initial_tokens": 5000,
+        "auto_load_threshold": 0.8,
+        "cache_duration_minutes": 30,
+        "compression_enabled": True,
+        "intelligent_preload": True
+    }
+}
+
+def read_mcp_server_config(settings_file):
+    """Read only the mcpServers subtree of a settings file.
+
+    Returns None when the key is missing or not a JSON object, so one
+    malformed settings file can't abort the whole scan.
+    """
+    if _JSON_PARSER is not None:
+        doc = _JSON_PARSER.load(str(settings_file))
+        try:
+            subtree = doc["mcpServers"]
+        except KeyError:
+            return None
+        mcp_servers = subtree.as_dict() if hasattr(subtree, "as_dict") else subtree
+    else:
+        with open(settings_file) as f:
+            mcp_servers = json.load(f).get("mcpServers")
+
+    return mcp_servers if isinstance(mcp_servers, dict) else None
+
 def get_mcp_servers():
     """Extract MCP server definitions from Claude config."""
     servers = {}
-    
+
     # Check settings files for MCP server configurations
     settings_files = [
         CLAUDE_DIR / "settings.json",
         CLAUDE_DIR / "settings.local.json",
         Path.home() / ".config" / "claude" / "config.json"
     ]
-    
+
+    # Most candidates are usually missing; opening directly and catching
+    # FileNotFoundError avoids an exists() stat per file before the open
     for settings_file in settings_files:
-        if settings_file.exists():
-            try:
-                with open(settings_file) as f:
-                    data = json.load(f)
-                    if "mcpServers" in data:
-                        servers.update(data["mcpServers"])
-            except:
-                pass
+        try:
+            mcp_servers = read_mcp_server_config(settings_file)
+            if mcp_servers:
+                servers.update(mcp_servers)
+        except (OSError, ValueError):
+            # Missing/unreadable file, or malformed JSON (JSONDecodeError
+            # and simdjson parse errors are both ValueErrors)
+            continue
     
     # Get active MCP servers from Claude CLI if available
     try:
@@ -44,119 +151,150 @@ def get_mcp_servers():
             timeout=5
         )
         if result.returncode == 0:
-            # Parse output to extract server names
-            for line in result.stdout.split('\n'):
-                if line.strip() and not line.startswith('#'):
-                    parts = line.split()
-                    if parts:
-                        server_name = parts[0]
-                        if server_name not in servers:
-                            servers[server_name] = {"detected": True}
-    except:
+            # Parse output to extract server names - only the first token
+            # of each line matters, so don't split the rest
+            for raw in result.stdout.splitlines():
+                line = raw.strip()
+                if not line or line[0] == '#':
+                    continue
+                server_name = line.split(None, 1)[0]
+                servers.setdefault(server_name, {"detected": True})
+    except (OSError, subprocess.TimeoutExpired):
+        # claude CLI not installed, not on PATH, or too slow
         pass
     
     return servers
 
+def walk_claude_md(root):
+    """Yield paths of CLAUDE.md files under root.
+
+    Uses os.scandir so directory checks reuse the readdir data instead
+    of stat()ing every entry (as Path.rglob does), and prunes noise
+    directories like node_modules that never hold agent definitions.
+    """
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        stack.append(entry.path)
+                elif entry.name == "CLAUDE.md":
+                    yield entry.path
+
 def analyze_agent_definitions():
     """Scan for custom agent definitions."""
     agents = {}
-    
+
     # Look for agent definition patterns in CLAUDE.md files
-    for claude_md in CLAUDE_DIR.rglob("CLAUDE.md"):
+    for claude_md in walk_claude_md(CLAUDE_DIR):
         try:
-            with open(claude_md) as f:
-                content = f.read()
-                # Look for agent definitions
-                agent_pattern = r"([\w-]+)-agent.*?:\s*([^\n]+)"
-                matches = re.findall(agent_pattern, content, re.IGNORECASE)
-                for name, description in matches:
-                    if name not in agents:
-                        agents[name] = {
-                            "description": description.strip(),
-                            "source": str(claude_md)
-                        }
-        except:
+            with open(claude_md, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue  # mmap rejects empty files
+                # Scan the mapped file directly - no read/decode copy
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for match in AGENT_PATTERN.finditer(mm):
+                        name = match.group(1).decode()
+                        if name not in agents:
+                            agents[name] = {
+                                "description": match.group(2).decode().strip(),
+                                "source": claude_md
+                            }
+        except (OSError, UnicodeDecodeError):
             pass
     
     return agents
 
-def estimate_token_cost(text):
-    """Rough estimate of token count (1 token ≈ 4 chars)."""
-    return len(text) // 4
+def estimate_token_cost_bytes(size):
+    """Rough estimate of token count (1 token ≈ 4 bytes)."""
+    return size // 4
 
 def extract_keywords(text):
     """Extract potential trigger keywords from text."""
-    # Define keywords per MCP server
-    keyword_map = {
-        "sequential-thinking": ["complex", "analyze", "think", "debug", "architect", "systematic", "reasoning"],
-        "context7": ["import", "require", "react", "vue", "angular", "next", "framework", "library", "docs"],
-        "magic": ["ui", "component", "button", "form", "modal", "frontend", "design", "/ui", "/21"],
-        "playwright": ["browser", "test", "e2e", "screenshot", "automation", "visual", "testing"],
-        "serena": ["symbol", "rename", "refactor", "find_symbol", "memory", "onboarding", "semantic"],
-        "morphllm": ["bulk", "edit", "pattern", "replace", "multi-file", "fast-apply"],
-        "ssh-wordpress": ["wordpress", "staging", "wp-cli", "theme", "css", "hostinger"],
-        "wordpress-tayloredfocus": ["tayloredfocus", "coaching", "post", "page", "content"],
-        "proxmox": ["vm", "container", "proxmox", "virtualization", "lxc"]
-    }
-    
     # Clean the server name (remove colons)
     clean_name = text.replace(":", "").lower()
-    
-    # Return predefined keywords if we have them
-    for server, keywords in keyword_map.items():
+
+    # Return predefined keywords if we have them - exact match is O(1)
+    if clean_name in KEYWORD_MAP:
+        return KEYWORD_MAP[clean_name]
+
+    # Fall back to substring matching for prefixed/decorated names
+    for server, keywords in KEYWORD_MAP.items():
         if server in clean_name:
             return keywords
-    
+
     # Fallback to pattern extraction
-    keywords = []
-    patterns = [
-        r'\b(React|Vue|Angular|Next\.js|Express)\b',
-        r'\b(API|database|server|frontend|backend)\b',
-        r'\b(test|debug|analyze|build|deploy)\b',
-        r'\b(security|performance|optimization)\b',
-        r'\b(WordPress|Docker|Kubernetes)\b'
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        keywords.extend([m.lower() for m in matches])
-    
-    return list(set(keywords))
+    return list({m.lower() for m in KEYWORD_PATTERN.findall(text)})
+
+def write_json(path, obj):
+    """Write obj as indented JSON, via orjson when available."""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(obj, f, indent=2)
+
+def config_file_name(name):
+    """Filesystem-safe config file name for a tool.
+
+    Tool names are arbitrary JSON keys - npm-style servers like
+    @scope/server contain separators - so percent-encode everything
+    before using the name as a path component. The lazy loader applies
+    the same encoding when reading configs back.
+    """
+    return f"{quote(name, safe='')}.json"
+
+def write_registry_index(registry):
+    """Split the registry into a small index plus per-tool configs.
+
+    The lazy loader only needs trigger keywords at startup; the full
+    config of a tool is read on demand from configs/<type>/<name>.json
+    the first time the tool is loaded.
+    """
+    index = {
+        "version": registry["version"],
+        "generated": registry["generated"],
+        "optimization_rules": registry["optimization_rules"],
+        "mcp_servers": {},
+        "custom_agents": {}
+    }
+
+    for section, subdir in (("mcp_servers", "mcp"), ("custom_agents", "agent")):
+        config_dir = CONFIG_DIR / subdir
+        os.makedirs(config_dir, exist_ok=True)
+
+        # Drop configs for tools gone from the environment - the loader
+        # prefers these files, so leftovers would stay loadable forever
+        current = {config_file_name(name) for name in registry[section]}
+        with os.scandir(config_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.name not in current:
+                    os.unlink(entry.path)
+
+        for name, info in registry[section].items():
+            index[section][name] = {
+                "trigger_keywords": info.get("trigger_keywords", [])
+            }
+            write_json(config_dir / config_file_name(name), info)
+
+    write_json(INDEX_FILE, index)
 
 def generate_registry():
     """Generate the complete tool registry."""
-    
+
     print("🔍 Analyzing Claude environment...")
-    
-    registry = {
-        "version": "2.1.0",
-        "generated": datetime.now().isoformat(),
-        "description": "Auto-generated lightweight tool registry for lazy loading",
-        "stats": {
-            "before_optimization": {
-                "mcp_tools": "39.8k tokens",
-                "custom_agents": "9.7k tokens", 
-                "system_tools": "22.6k tokens",
-                "memory_files": "36.0k tokens",
-                "total": "~108k tokens (54%)"
-            },
-            "after_optimization": {
-                "registry_size": "~5k tokens",
-                "lazy_load_enabled": True,
-                "expected_reduction": "95%"
-            }
-        },
-        "mcp_servers": {},
-        "custom_agents": {},
-        "optimization_rules": {
-            "max_initial_tokens": 5000,
-            "auto_load_threshold": 0.8,
-            "cache_duration_minutes": 30,
-            "compression_enabled": True,
-            "intelligent_preload": True
-        }
-    }
-    
+
+    registry = copy.deepcopy(_REGISTRY_SKELETON)
+    registry["generated"] = datetime.now().isoformat()
+    registry["mcp_servers"] = {}
+    registry["custom_agents"] = {}
+
     # Detect MCP servers
     print("  📦 Detecting MCP servers...")
     mcp_servers = get_mcp_servers()
@@ -177,12 +315,15 @@ def generate_registry():
             "trigger_keywords": extract_keywords(agent_name + " " + agent_info.get("description", ""))
         }
     
-    # Save registry
+    # Save the combined registry (kept for inspection and as a fallback)
     os.makedirs(REGISTRY_FILE.parent, exist_ok=True)
-    with open(REGISTRY_FILE, 'w') as f:
-        json.dump(registry, f, indent=2)
-    
+    write_json(REGISTRY_FILE, registry)
+
+    # Save the split index + per-tool configs for two-phase loading
+    write_registry_index(registry)
+
     print(f"✅ Registry saved to: {REGISTRY_FILE}")
+    print(f"   Lazy-load index: {INDEX_FILE}")
     print(f"   - Detected {len(mcp_servers)} MCP servers")
     print(f"   - Found {len(agents)} custom agents")
     print(f"   - Expected token reduction: ~103k tokens (95%)")
@@ -206,9 +347,9 @@ def validate_registry():
                 print(f"❌ Missing required key: {key}")
                 return False
         
-        # Estimate registry size
-        registry_text = json.dumps(registry)
-        token_estimate = estimate_token_cost(registry_text)
+        # Estimate registry size from the file we just read - no need to
+        # re-serialize the whole tree just to measure it
+        token_estimate = estimate_token_cost_bytes(REGISTRY_FILE.stat().st_size)
         
         print(f"✅ Registry validated successfully")
         print(f"   - Version: {registry.get('version')}")
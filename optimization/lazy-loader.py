@@ -5,104 +5,332 @@ This should be integrated into Claude's startup sequence.
 """
 
 import json
+import os
 import re
 import sys
+import time
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+# Optional: hyperscan JIT-compiles all keywords into one SIMD-backed
+# DFA - the fastest scan path for long-running deployments with many
+# registered tools.
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Optional: pyahocorasick gives linear-time multi-keyword matching.
+# Fall back to plain substring scans if it isn't installed.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional: pysimdjson lazily materializes only the JSON subtrees we
+# touch. Fall back to stdlib json if it isn't installed.
+try:
+    import simdjson
+    _JSON_PARSER = simdjson.Parser()
+except ImportError:
+    _JSON_PARSER = None
+
+# The only registry sections the loader ever reads
+_REGISTRY_KEYS = ("mcp_servers", "custom_agents", "optimization_rules")
+
+# Command patterns are static, so compile them once at import time.
+# Each pattern is searched independently: patterns can match inside
+# another pattern's span, so a single combined pass would drop hits.
+_COMMAND_TABLE = [(re.compile(pattern), tools) for pattern, tools in {
+    r"/analyze": ["mcp:sequential-thinking", "mcp:serena"],
+    r"/build.*ui|/ui|/21": ["mcp:magic", "agent:frontend-developer"],
+    r"/test": ["mcp:playwright", "agent:test-writer-fixer"],
+    r"wordpress|tayloredfocus": ["mcp:ssh-wordpress", "mcp:wordpress-tayloredfocus"],
+    r"import.*from|require\(": ["mcp:context7"],
+    r"security|audit|vulnerability": ["agent:security-engineer", "mcp:sequential-thinking"],
+    r"document|readme|guide": ["agent:technical-writer", "mcp:context7"]
+}.items()]
+
+# Static preload profiles for common workflows (tuples: built once,
+# never mutated)
+_PROFILES: Dict[str, Tuple[str, ...]] = {
+    "wordpress": (
+        "mcp:ssh-wordpress",
+        "mcp:wordpress-tayloredfocus",
+        "agent:frontend-developer"
+    ),
+    "react": (
+        "mcp:context7",
+        "mcp:magic",
+        "agent:frontend-developer",
+        "agent:test-writer-fixer"
+    ),
+    "testing": (
+        "mcp:playwright",
+        "agent:test-writer-fixer",
+        "agent:quality-engineer"
+    ),
+    "security": (
+        "agent:security-engineer",
+        "mcp:sequential-thinking",
+        "agent:legal-compliance-checker"
+    ),
+    "backend": (
+        "agent:backend-architect",
+        "mcp:context7",
+        "mcp:sequential-thinking"
+    )
+}
 
 class ClaudeLazyLoader:
     def __init__(self):
-        self.registry_path = Path.home() / ".claude" / "optimization" / "tool-registry.json"
+        optimization_dir = Path.home() / ".claude" / "optimization"
+        self.registry_path = optimization_dir / "tool-registry.json"
+        self.index_path = optimization_dir / "tool-registry" / "index.json"
+        self.config_dir = optimization_dir / "tool-registry" / "configs"
+        self.session_path = optimization_dir / "session.json"
         self.loaded_tools: Set[str] = set()
         self.registry: Dict = {}
+        self._config_cache: Dict[str, Dict] = {}
+        self._keyword_automaton: Optional["ahocorasick.Automaton"] = None
+        self._hyperscan_db: Optional["hyperscan.Database"] = None
+        self._hyperscan_tools: List[Tuple[str, ...]] = []
+        self._tool_keywords: List[Tuple[str, Tuple[str, ...]]] = []
+        self._persisted_tools: Set[str] = set()
+        self._loaded_token_cost = 0
         self.load_registry()
-    
+        self._load_session()
+
     def load_registry(self):
-        """Load the tool registry."""
-        if not self.registry_path.exists():
+        """Load the tool registry.
+
+        Prefers the two-phase layout: only the small keyword index is
+        parsed at startup, and full tool configs are read on demand the
+        first time load_tools needs them. Falls back to the monolithic
+        tool-registry.json when no index has been generated.
+        """
+        if self.index_path.exists():
+            registry_file = self.index_path
+        elif self.registry_path.exists():
+            registry_file = self.registry_path
+        else:
             print(f"⚠️  Registry not found at {self.registry_path}")
             print("   Run: python3 ~/.claude/optimization/generate-index.py")
             sys.exit(1)
-        
-        with open(self.registry_path) as f:
-            self.registry = json.load(f)
+
+        if _JSON_PARSER is not None:
+            # Materialize only the sections we actually use
+            doc = _JSON_PARSER.load(str(registry_file))
+            self.registry = {}
+            for key in _REGISTRY_KEYS:
+                try:
+                    self.registry[key] = doc[key].as_dict()
+                except KeyError:
+                    pass
+        else:
+            with open(registry_file) as f:
+                self.registry = json.load(f)
+
+        self._build_keyword_index()
+
+    def _load_session(self):
+        """Restore loaded_tools persisted by a previous CLI invocation.
+
+        Each invocation is a fresh process, so without this the
+        already-loaded guards never fire across calls. Sessions older
+        than the configured cache duration are treated as expired.
+        """
+        try:
+            mtime = self.session_path.stat().st_mtime
+        except OSError:
+            return
+
+        ttl_minutes = self.registry.get("optimization_rules", {}).get(
+            "cache_duration_minutes", 30)
+        if time.time() - mtime > ttl_minutes * 60:
+            return
+
+        try:
+            with open(self.session_path) as f:
+                self.loaded_tools = set(json.load(f))
+        except (OSError, ValueError):
+            return
+        self._persisted_tools = set(self.loaded_tools)
+        self._loaded_token_cost = sum(
+            self._tool_token_cost(tool) for tool in self.loaded_tools)
+
+    def _save_session(self):
+        """Persist loaded_tools so the next invocation resumes it."""
+        if self.loaded_tools == self._persisted_tools:
+            return
+
+        tmp_path = self.session_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(sorted(self.loaded_tools), f)
+        os.replace(tmp_path, self.session_path)
+        self._persisted_tools = set(self.loaded_tools)
+
+    def _tool_token_cost(self, tool: str) -> int:
+        """Token cost of a tool, with per-type defaults.
+
+        Priced from the full config (the index never carries
+        token_cost) so fresh loads and session restores agree.
+        """
+        tool_type = tool.split(":", 1)[0]
+        config = self._load_config(tool) or {}
+        return config.get("token_cost", 1000 if tool_type == "mcp" else 100)
+
+    def _load_config(self, tool: str) -> Optional[Dict]:
+        """Load a tool's full config, reading its file on first use."""
+        if tool in self._config_cache:
+            return self._config_cache[tool]
+
+        tool_type, tool_name = tool.split(":", 1)
+        # Names are percent-encoded on disk (they may contain path
+        # separators, e.g. npm-style @scope/server)
+        config_path = (self.config_dir / tool_type
+                       / f"{quote(tool_name, safe='')}.json")
+        if config_path.exists():
+            with open(config_path) as f:
+                config = json.load(f)
+        else:
+            # Monolithic registry (or index-only entry) fallback
+            section = "mcp_servers" if tool_type == "mcp" else "custom_agents"
+            config = self.registry.get(section, {}).get(tool_name)
+
+        if config is not None:
+            self._config_cache[tool] = config
+        return config
+
+    def _build_keyword_index(self):
+        """Precompute the trigger-keyword tables from the registry.
+
+        Lowercases every keyword once here so analyze_input never calls
+        .lower() per keyword, and builds an Aho-Corasick automaton (when
+        available) so one pass over the input finds every keyword match.
+        """
+        self._tool_keywords = []
+        # A keyword can trigger multiple tools, so collect tool IDs per keyword
+        keyword_tools: Dict[str, Set[str]] = {}
+
+        for category, prefix in (("mcp_servers", "mcp"), ("custom_agents", "agent")):
+            for name, info in self.registry.get(category, {}).items():
+                tool_id = f"{prefix}:{name}"
+                keywords = tuple(k.lower() for k in info.get("trigger_keywords", []))
+                if not keywords:
+                    continue
+                self._tool_keywords.append((tool_id, keywords))
+                for keyword in keywords:
+                    keyword_tools.setdefault(keyword, set()).add(tool_id)
+
+        if not keyword_tools:
+            return
+
+        # Prefer hyperscan's compiled DFA; fall back to Aho-Corasick
+        if hyperscan is not None:
+            try:
+                db = hyperscan.Database()
+                db.compile(
+                    expressions=[re.escape(kw).encode() for kw in keyword_tools],
+                    ids=list(range(len(keyword_tools))),
+                    elements=len(keyword_tools),
+                    flags=[hyperscan.HS_FLAG_CASELESS] * len(keyword_tools)
+                )
+            except hyperscan.error:
+                pass
+            else:
+                self._hyperscan_tools = [tuple(t) for t in keyword_tools.values()]
+                self._hyperscan_db = db
+                return
+
+        if ahocorasick is None:
+            return
+
+        automaton = ahocorasick.Automaton()
+        for keyword, tools in keyword_tools.items():
+            automaton.add_word(keyword, tuple(tools))
+        automaton.make_automaton()
+        self._keyword_automaton = automaton
     
     def analyze_input(self, user_input: str) -> List[str]:
         """Analyze user input to determine which tools to load."""
-        tools_to_load = []
+        tools_to_load: Set[str] = set()
         input_lower = user_input.lower()
-        
-        # Check MCP servers
-        for server_name, server_info in self.registry.get("mcp_servers", {}).items():
-            if server_name in self.loaded_tools:
-                continue
-            
-            # Check trigger keywords
-            for keyword in server_info.get("trigger_keywords", []):
-                if keyword.lower() in input_lower:
-                    tools_to_load.append(f"mcp:{server_name}")
-                    break
-        
-        # Check custom agents
-        for agent_name, agent_info in self.registry.get("custom_agents", {}).items():
-            if agent_name in self.loaded_tools:
-                continue
-            
-            # Check trigger keywords
-            for keyword in agent_info.get("trigger_keywords", []):
-                if keyword.lower() in input_lower:
-                    tools_to_load.append(f"agent:{agent_name}")
-                    break
-        
+
+        if self._hyperscan_db is not None:
+            # Single DFA pass over the input finds every trigger keyword
+            def on_match(pattern_id, _start, _end, _flags, _context=None):
+                tools_to_load.update(self._hyperscan_tools[pattern_id])
+
+            self._hyperscan_db.scan(input_lower.encode(),
+                                    match_event_handler=on_match)
+        elif self._keyword_automaton is not None:
+            # Single scan of the input finds every trigger keyword
+            for _end, tools in self._keyword_automaton.iter(input_lower):
+                tools_to_load.update(tools)
+        else:
+            # Check trigger keywords per tool (pre-lowercased at load time)
+            for tool_id, keywords in self._tool_keywords:
+                if tool_id in self.loaded_tools:
+                    continue
+
+                for keyword in keywords:
+                    if keyword in input_lower:
+                        tools_to_load.add(tool_id)
+                        break
+
         # Check for specific commands
-        command_patterns = {
-            r"/analyze": ["mcp:sequential-thinking", "mcp:serena"],
-            r"/build.*ui|/ui|/21": ["mcp:magic", "agent:frontend-developer"],
-            r"/test": ["mcp:playwright", "agent:test-writer-fixer"],
-            r"wordpress|tayloredfocus": ["mcp:ssh-wordpress", "mcp:wordpress-tayloredfocus"],
-            r"import.*from|require\(": ["mcp:context7"],
-            r"security|audit|vulnerability": ["agent:security-engineer", "mcp:sequential-thinking"],
-            r"document|readme|guide": ["agent:technical-writer", "mcp:context7"]
-        }
-        
-        for pattern, tools in command_patterns.items():
-            if re.search(pattern, input_lower):
-                tools_to_load.extend(tools)
-        
-        # Remove duplicates and already loaded
-        tools_to_load = list(set(tools_to_load) - self.loaded_tools)
-        
-        return tools_to_load
+        for pattern, tools in _COMMAND_TABLE:
+            if pattern.search(input_lower):
+                tools_to_load.update(tools)
+
+        # Drop already-loaded tools
+        return list(tools_to_load - self.loaded_tools)
     
     def load_tools(self, tools: List[str]) -> Dict:
         """Load specified tools and return their configurations."""
         loaded_configs = {}
-        
+        # Buffer per-tool messages and flush once: one stdout write
+        # instead of one syscall per loaded tool
+        messages = []
+
         for tool in tools:
             tool_type, tool_name = tool.split(":", 1)
-            
+            if tool_type not in ("mcp", "agent"):
+                continue
+
+            # Full config is only read from disk here, on first load
+            config = self._load_config(tool)
+            if config is None:
+                continue
+
+            # Keep the running token total in step with loaded_tools
+            if tool not in self.loaded_tools:
+                self._loaded_token_cost += self._tool_token_cost(tool)
+
             if tool_type == "mcp":
-                # Load MCP server configuration
-                if tool_name in self.registry.get("mcp_servers", {}):
-                    loaded_configs[tool] = {
-                        "type": "mcp_server",
-                        "name": tool_name,
-                        "config": self.registry["mcp_servers"][tool_name]
-                    }
-                    self.loaded_tools.add(tool)
-                    print(f"  ✅ Loaded MCP server: {tool_name}")
-            
+                loaded_configs[tool] = {
+                    "type": "mcp_server",
+                    "name": tool_name,
+                    "config": config
+                }
+                self.loaded_tools.add(tool)
+                messages.append(f"  ✅ Loaded MCP server: {tool_name}")
+
             elif tool_type == "agent":
-                # Load custom agent configuration
-                if tool_name in self.registry.get("custom_agents", {}):
-                    loaded_configs[tool] = {
-                        "type": "custom_agent",
-                        "name": tool_name,
-                        "config": self.registry["custom_agents"][tool_name]
-                    }
-                    self.loaded_tools.add(tool)
-                    print(f"  ✅ Loaded agent: {tool_name}")
-        
+                loaded_configs[tool] = {
+                    "type": "custom_agent",
+                    "name": tool_name,
+                    "config": config
+                }
+                self.loaded_tools.add(tool)
+                messages.append(f"  ✅ Loaded agent: {tool_name}")
+
+        if messages:
+            sys.stdout.write("\n".join(messages) + "\n")
+
+        self._save_session()
         return loaded_configs
     
     def get_stats(self) -> Dict:
@@ -129,18 +357,11 @@ class ClaudeLazyLoader:
         """Estimate token savings from lazy loading."""
         # Base registry size
         base_tokens = 5000
-        
-        # Add loaded tool tokens
-        loaded_tokens = 0
-        for tool in self.loaded_tools:
-            tool_type, tool_name = tool.split(":", 1)
-            if tool_type == "mcp":
-                server_info = self.registry.get("mcp_servers", {}).get(tool_name, {})
-                loaded_tokens += server_info.get("token_cost", 1000)
-            elif tool_type == "agent":
-                agent_info = self.registry.get("custom_agents", {}).get(tool_name, {})
-                loaded_tokens += agent_info.get("token_cost", 100)
-        
+
+        # Running total maintained as tools are loaded - no per-call
+        # walk over loaded_tools
+        loaded_tokens = self._loaded_token_cost
+
         # Calculate savings
         max_tokens = 108000  # Original load
         current_tokens = base_tokens + loaded_tokens
@@ -154,42 +375,13 @@ class ClaudeLazyLoader:
     
     def preload_profile(self, profile: str):
         """Preload tools for common workflows."""
-        profiles = {
-            "wordpress": [
-                "mcp:ssh-wordpress",
-                "mcp:wordpress-tayloredfocus",
-                "agent:frontend-developer"
-            ],
-            "react": [
-                "mcp:context7",
-                "mcp:magic",
-                "agent:frontend-developer",
-                "agent:test-writer-fixer"
-            ],
-            "testing": [
-                "mcp:playwright",
-                "agent:test-writer-fixer",
-                "agent:quality-engineer"
-            ],
-            "security": [
-                "agent:security-engineer",
-                "mcp:sequential-thinking",
-                "agent:legal-compliance-checker"
-            ],
-            "backend": [
-                "agent:backend-architect",
-                "mcp:context7",
-                "mcp:sequential-thinking"
-            ]
-        }
-        
-        if profile in profiles:
-            tools = profiles[profile]
+        tools = _PROFILES.get(profile)
+        if tools is not None:
             print(f"📦 Preloading profile: {profile}")
             self.load_tools(tools)
         else:
             print(f"❌ Unknown profile: {profile}")
-            print(f"   Available: {', '.join(profiles.keys())}")
+            print(f"   Available: {', '.join(_PROFILES.keys())}")
 
 
 def main():